@@ -8,7 +8,8 @@ import sys
 import os
 from pathlib import Path
 
-# Configurar UTF-8 para Windows
+# Configurar UTF-8 para Windows (la variable la heredan los subprocesos)
+os.environ.setdefault("PYTHONUTF8", "1")
 if sys.platform == "win32":
     os.environ["PYTHONIOENCODING"] = "utf-8"
     if hasattr(sys.stdout, "reconfigure"):
@@ -44,9 +45,9 @@ def run_preprocessing():
     print("FASE 2: PREPROCESAMIENTO Y BALANCEO")
     print("=" * 70)
     
-    from src.model.preprocessing import preprocess_and_balance
-    
-    stats = preprocess_and_balance(balance_strategy="undersample")
+    from src.model.preprocessing import preprocess_and_balance_cached
+
+    stats = preprocess_and_balance_cached(balance_strategy="undersample")
     return stats
 
 
@@ -1,57 +1,54 @@
 """
 Script 01: Prueba de conexión a MongoDB Atlas.
 Ejecutar primero para verificar que la configuración es correcta.
+
+Uso:
+    python scripts/01_test_connection.py          # Solo prueba conexión/permisos
+    python scripts/01_test_connection.py --init   # Además crea las colecciones
 """
 
 import sys
-import os
-from pathlib import Path
-
-# Configurar UTF-8 para Windows
-if sys.platform == "win32":
-    os.environ["PYTHONIOENCODING"] = "utf-8"
-    if hasattr(sys.stdout, "reconfigure"):
-        sys.stdout.reconfigure(encoding="utf-8")
-    if hasattr(sys.stderr, "reconfigure"):
-        sys.stderr.reconfigure(encoding="utf-8")
 
-# Agregar el directorio raíz al path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
 
 from src.data.db import test_connection, init_database, get_database
 
 def main():
+    do_init = "--init" in sys.argv
+
     print("=" * 60)
     print("🔌 PRUEBA DE CONEXIÓN A MONGODB ATLAS")
     print("=" * 60)
-    
+
     # Test 1: Conexión básica
     print("\n[1/3] Probando conexión...")
     if not test_connection():
         print("\n❌ FALLO: No se pudo conectar a MongoDB")
         print("   Verifica tu archivo .env con MONGO_URI correcto")
         sys.exit(1)
-    
-    # Test 2: Inicializar base de datos
+
+    # Test 2: Inicializar base de datos (solo bajo demanda: cada llamada
+    # cuesta round-trips a Atlas y el ETL igualmente crea las colecciones)
     print("\n[2/3] Inicializando base de datos y colecciones...")
-    try:
-        info = init_database()
-        print(f"   ✓ Base de datos: {info['database']}")
-        print(f"   ✓ Colecciones creadas: {info['created_collections']}")
-        print(f"   ✓ Colecciones existentes: {info['existing_collections']}")
-    except Exception as e:
-        print(f"\n❌ FALLO al inicializar: {e}")
-        sys.exit(1)
-    
-    # Test 3: Verificar acceso
+    if do_init:
+        try:
+            info = init_database()
+            print(f"   ✓ Base de datos: {info['database']}")
+            print(f"   ✓ Colecciones creadas: {info['created_collections']}")
+            print(f"   ✓ Colecciones existentes: {info['existing_collections']}")
+        except Exception as e:
+            print(f"\n❌ FALLO al inicializar: {e}")
+            sys.exit(1)
+    else:
+        print("   ↻ Omitido (ejecuta con --init para crear las colecciones)")
+
+    # Test 3: Verificar acceso con una sola escritura de prueba
     print("\n[3/3] Verificando permisos de escritura...")
     try:
         db = get_database()
-        # Intentar insertar y eliminar un documento de prueba
-        test_col = db["_test_connection"]
-        test_col.insert_one({"test": True})
-        test_col.delete_many({})
-        db.drop_collection("_test_connection")
+        # Un solo comando insert (1 round-trip) y limpieza de la colección
+        db.command({"insert": "_probe", "documents": [{"test": True}]})
+        db.drop_collection("_probe")
         print("   ✓ Permisos de lectura/escritura: OK")
     except Exception as e:
         print(f"\n❌ FALLO en permisos: {e}")
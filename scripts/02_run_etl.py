@@ -7,20 +7,11 @@ Uso:
     python scripts/02_run_etl.py --debug  # Con información de debugging
 """
 
-import sys
 import os
+import sys
 from pathlib import Path
 
-# Configurar UTF-8 para Windows
-if sys.platform == "win32":
-    os.environ["PYTHONIOENCODING"] = "utf-8"
-    if hasattr(sys.stdout, "reconfigure"):
-        sys.stdout.reconfigure(encoding="utf-8")
-    if hasattr(sys.stderr, "reconfigure"):
-        sys.stderr.reconfigure(encoding="utf-8")
-
-# Agregar el directorio raíz al path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
 
 from src.data.etl import run_etl_pipeline
 
@@ -41,8 +32,13 @@ def main():
         print("   Asegúrate de que los archivos Excel estén en ./Dataset/")
         sys.exit(1)
     
-    # Contar archivos
-    excel_files = sorted(list(dataset_path.glob("*.xlsx")))
+    # Contar archivos (os.scandir evita el stat por entrada de glob)
+    with os.scandir(dataset_path) as entries:
+        excel_files = sorted(
+            dataset_path / entry.name
+            for entry in entries
+            if entry.name.endswith(".xlsx") and entry.is_file(follow_symlinks=False)
+        )
     print(f"\n📁 Archivos Excel encontrados: {len(excel_files)}")
     for f in excel_files:
         print(f"   • {f.name}")
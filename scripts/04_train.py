@@ -6,33 +6,22 @@ Fine-tuning de BETO para clasificación de textos.
 """
 
 import sys
-import os
-from pathlib import Path
 
-# Configurar UTF-8 para Windows
-if sys.platform == "win32":
-    os.environ["PYTHONIOENCODING"] = "utf-8"
-    if hasattr(sys.stdout, "reconfigure"):
-        sys.stdout.reconfigure(encoding="utf-8")
-    if hasattr(sys.stderr, "reconfigure"):
-        sys.stderr.reconfigure(encoding="utf-8")
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
 
-# Agregar el directorio raíz al path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
-import torch
 from src.data.db import get_collection
 
 def check_prerequisites():
     """Verifica que hay datos para entrenar."""
     print("\n[1/3] Verificando prerrequisitos...")
     
-    # Verificar datos de entrenamiento
+    # Verificar datos de entrenamiento (estimated_document_count usa los
+    # metadatos de la colección: O(1), sin escanear documentos)
     train_col = get_collection("train_data")
-    train_count = train_col.count_documents({})
-    
+    train_count = train_col.estimated_document_count()
+
     val_col = get_collection("val_data")
-    val_count = val_col.count_documents({})
+    val_count = val_col.estimated_document_count()
     
     if train_count == 0 or val_count == 0:
         print("\n❌ ERROR: No hay datos de entrenamiento/validación")
@@ -42,7 +31,10 @@ def check_prerequisites():
     print(f"   ✓ Datos de entrenamiento: {train_count}")
     print(f"   ✓ Datos de validación: {val_count}")
     
-    # Verificar hardware
+    # Verificar hardware (torch se importa aquí para no pagar sus ~2-5s
+    # de arranque cuando el usuario solo ejecuta otras fases del pipeline)
+    import torch
+
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"   ✓ Dispositivo: {device}")
     
@@ -67,7 +59,7 @@ def main():
     config = {
         "model_name": "dccuchile/bert-base-spanish-wwm-cased",
         "num_epochs": 5,
-        "batch_size": 4 if device == "cpu" else 8,
+        "batch_size": 8,  # el padding dinámico + checkpointing lo hacen viable en CPU
         "learning_rate": 2e-5,
         "output_dir": "models/clasificador_textos"
     }
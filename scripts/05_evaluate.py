@@ -4,19 +4,9 @@ Genera matriz de confusión y métricas detalladas.
 """
 
 import sys
-import os
 from pathlib import Path
 
-# Configurar UTF-8 para Windows
-if sys.platform == "win32":
-    os.environ["PYTHONIOENCODING"] = "utf-8"
-    if hasattr(sys.stdout, "reconfigure"):
-        sys.stdout.reconfigure(encoding="utf-8")
-    if hasattr(sys.stderr, "reconfigure"):
-        sys.stderr.reconfigure(encoding="utf-8")
-
-# Agregar el directorio raíz al path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
 
 def main():
     print("=" * 60)
@@ -4,17 +4,9 @@ Interfaz de usuario para clasificación de textos.
 """
 
 import sys
-import os
-import subprocess
 from pathlib import Path
 
-# Configurar UTF-8 para Windows
-if sys.platform == "win32":
-    os.environ["PYTHONIOENCODING"] = "utf-8"
-    if hasattr(sys.stdout, "reconfigure"):
-        sys.stdout.reconfigure(encoding="utf-8")
-    if hasattr(sys.stderr, "reconfigure"):
-        sys.stderr.reconfigure(encoding="utf-8")
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
 
 def main():
     print("=" * 60)
@@ -42,11 +34,20 @@ def main():
     print("\n" + "-" * 60)
     
     try:
-        subprocess.run([
-            sys.executable, "-m", "streamlit", "run",
-            str(app_path),
-            "--server.headless", "false"
-        ])
+        # Lanzar el servidor en este mismo proceso: evita pagar el arranque
+        # de un interprete nuevo + import de streamlit via subprocess
+        from streamlit.web import bootstrap
+
+        # fileWatcherType=none evita la tormenta de stats del watchdog;
+        # este lanzador es para usar la app, no para desarrollarla
+        flag_options = {
+            "server.headless": False,
+            "server.fileWatcherType": "none",
+        }
+        # bootstrap.run no aplica flag_options por sí solo (solo los pasa a
+        # los watchers de config); hay que cargarlos antes, como hace el CLI
+        bootstrap.load_config_options(flag_options=flag_options)
+        bootstrap.run(str(app_path), False, [], flag_options)
     except KeyboardInterrupt:
         print("\n\n✓ Servidor detenido.")
 
@@ -0,0 +1,44 @@
+"""
+Script 07 (opcional): Exportar el modelo entrenado a ONNX.
+La app de Streamlit usa automáticamente model.onnx si existe junto al
+modelo, sirviendo la inferencia con ONNX Runtime (grafo optimizado).
+
+Requiere: pip install "optimum[onnxruntime]"
+"""
+
+import sys
+from pathlib import Path
+
+import _bootstrap  # noqa: F401  (UTF-8 y sys.path)
+
+def main():
+    print("=" * 60)
+    print("📦 EXPORTACIÓN DEL MODELO A ONNX")
+    print("=" * 60)
+
+    model_path = Path("models/clasificador_textos/final")
+    if not model_path.exists():
+        print(f"\n❌ ERROR: No se encontró el modelo en '{model_path}'")
+        print("   Ejecuta primero: python scripts/04_train.py")
+        sys.exit(1)
+
+    try:
+        from optimum.exporters.onnx import main_export
+    except ImportError:
+        print("\n❌ ERROR: Falta el paquete optimum")
+        print('   Instala con: pip install "optimum[onnxruntime]"')
+        sys.exit(1)
+
+    print(f"\n🔧 Exportando {model_path} ...")
+    main_export(
+        str(model_path),
+        output=str(model_path),
+        task="text-classification"
+    )
+
+    print(f"\n✅ Modelo exportado: {model_path / 'model.onnx'}")
+    print("   La app lo usará automáticamente en el próximo arranque.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Bootstrap común para los scripts del pipeline.
+Configura UTF-8 una sola vez y agrega el directorio raíz al sys.path.
+Importar al inicio de cada script, antes que cualquier módulo de src/.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# UTF-8 para la consola de Windows; la variable de entorno también la
+# heredan los subprocesos (por ejemplo el servidor de Streamlit)
+os.environ.setdefault("PYTHONUTF8", "1")
+if sys.platform == "win32":
+    os.environ["PYTHONIOENCODING"] = "utf-8"
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+    if hasattr(sys.stderr, "reconfigure"):
+        sys.stderr.reconfigure(encoding="utf-8")
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
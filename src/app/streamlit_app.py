@@ -3,12 +3,21 @@ Aplicación Streamlit para clasificación de textos clásicos.
 Interfaz de usuario para investigadores de humanidades.
 """
 
+import os
+from functools import lru_cache, partial
+
+import altair as alt
 import streamlit as st
 from pathlib import Path
+import numpy as np
+import pandas as pd
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch.nn.functional as F
 
+# Habilitar los hilos internos del tokenizer Rust antes de construirlo
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+
 # Configuración de página
 st.set_page_config(
     page_title="Clasificador de Textos Clásicos",
@@ -17,135 +26,19 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Estilos CSS personalizados
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Cormorant+Garamond:wght@400;500;600;700&family=Crimson+Pro:wght@400;500;600&display=swap');
-    
-    .main {
-        background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #0f3460 100%);
-    }
-    
-    .stApp {
-        background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #0f3460 100%);
-    }
-    
-    h1 {
-        font-family: 'Cormorant Garamond', serif !important;
-        color: #e8d5b7 !important;
-        text-align: center;
-        font-size: 3rem !important;
-        font-weight: 700 !important;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-        margin-bottom: 0.5rem !important;
-    }
-    
-    .subtitle {
-        font-family: 'Crimson Pro', serif;
-        color: #b8a88a;
-        text-align: center;
-        font-size: 1.2rem;
-        font-style: italic;
-        margin-bottom: 2rem;
-    }
-    
-    .stTextArea textarea {
-        font-family: 'Crimson Pro', serif !important;
-        font-size: 1.1rem !important;
-        background-color: #0d1b2a !important;
-        border: 2px solid #1b263b !important;
-        border-radius: 12px !important;
-        color: #e0e1dd !important;
-        padding: 1rem !important;
-    }
-    
-    .stTextArea textarea:focus {
-        border-color: #c9a959 !important;
-        box-shadow: 0 0 15px rgba(201, 169, 89, 0.3) !important;
-    }
-    
-    .stButton > button {
-        font-family: 'Cormorant Garamond', serif !important;
-        background: linear-gradient(135deg, #c9a959 0%, #a17d32 100%) !important;
-        color: #1a1a2e !important;
-        font-size: 1.3rem !important;
-        font-weight: 600 !important;
-        padding: 0.8rem 3rem !important;
-        border: none !important;
-        border-radius: 30px !important;
-        transition: all 0.3s ease !important;
-        text-transform: uppercase;
-        letter-spacing: 2px;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 8px 25px rgba(201, 169, 89, 0.4) !important;
-    }
-    
-    .result-card {
-        background: linear-gradient(145deg, #1b263b 0%, #0d1b2a 100%);
-        border: 1px solid #415a77;
-        border-radius: 16px;
-        padding: 2rem;
-        margin-top: 2rem;
-        box-shadow: 0 10px 40px rgba(0,0,0,0.4);
-    }
-    
-    .category-label {
-        font-family: 'Cormorant Garamond', serif;
-        font-size: 2rem;
-        font-weight: 700;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    
-    .arete { color: #50fa7b; }
-    .politica { color: #ff79c6; }
-    .dioses { color: #8be9fd; }
-    
-    .confidence-text {
-        font-family: 'Crimson Pro', serif;
-        color: #b8a88a;
-        text-align: center;
-        font-size: 1.1rem;
-    }
-    
-    .progress-container {
-        background-color: #1b263b;
-        border-radius: 10px;
-        overflow: hidden;
-        margin: 1rem 0;
-    }
-    
-    .category-desc {
-        font-family: 'Crimson Pro', serif;
-        color: #778da9;
-        text-align: center;
-        font-style: italic;
-        margin-top: 1.5rem;
-        padding: 1rem;
-        border-top: 1px solid #415a77;
-    }
-    
-    .info-section {
-        background: rgba(65, 90, 119, 0.2);
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-top: 3rem;
-    }
-    
-    .info-section h3 {
-        font-family: 'Cormorant Garamond', serif !important;
-        color: #e8d5b7 !important;
-    }
-    
-    .info-section p, .info-section li {
-        font-family: 'Crimson Pro', serif;
-        color: #b8a88a;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Estilos CSS personalizados: el archivo se lee una sola vez al importar
+# el módulo; en cada rerun solo se re-emite la cadena ya construida.
+# Las fuentes se cargan con preconnect + stylesheet (no bloquean el primer
+# paint como lo hacía el @import dentro del CSS).
+_CSS = (Path(__file__).parent / "styles.css").read_text(encoding="utf-8")
+_FONTS_HTML = (
+    '<link rel="preconnect" href="https://fonts.googleapis.com">'
+    '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>'
+    '<link rel="stylesheet" href="https://fonts.googleapis.com/css2'
+    '?family=Cormorant+Garamond:wght@400;500;600;700'
+    '&family=Crimson+Pro:wght@400;500;600&display=swap">'
+)
+st.markdown(f"{_FONTS_HTML}<style>{_CSS}</style>", unsafe_allow_html=True)
 
 # Mapeo de categorías
 CATEGORY_INFO = {
@@ -168,50 +61,155 @@ CATEGORY_INFO = {
 
 MODEL_PATH = Path("models/clasificador_textos/final")
 
+# Exportado opcionalmente con scripts/07_export_onnx.py
+ONNX_MODEL_PATH = MODEL_PATH / "model.onnx"
 
-@st.cache_resource
+
+@st.cache_resource(show_spinner=False)
 def load_model():
-    """Carga el modelo entrenado (cacheado para velocidad)."""
+    """Carga el modelo entrenado (una sola vez por worker, no por rerun)."""
     if not MODEL_PATH.exists():
         return None, None, None
-    
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+
+    # use_fast explícito: sin los archivos del tokenizer rápido, transformers
+    # puede caer en silencio al tokenizer Python (órdenes de magnitud más lento)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH, use_fast=True)
+
+    # Si el modelo fue exportado a ONNX, servirlo con ONNX Runtime:
+    # grafo optimizado (fusión de Attention/LayerNorm) y sin overhead
+    # de dispatch de PyTorch en el camino caliente
+    if ONNX_MODEL_PATH.exists():
+        try:
+            import onnxruntime as ort
+
+            preferred = (
+                "TensorrtExecutionProvider",
+                "CUDAExecutionProvider",
+                "CPUExecutionProvider",
+            )
+            available = ort.get_available_providers()
+            session = ort.InferenceSession(
+                str(ONNX_MODEL_PATH),
+                providers=[p for p in preferred if p in available]
+            )
+            return session, tokenizer, "onnx"
+        except ImportError:
+            pass  # onnxruntime no instalado: seguir con PyTorch
+
     model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
     model.eval()
-    
+
     device = "cuda" if torch.cuda.is_available() else "cpu"
     model.to(device)
-    
+
+    if device == "cpu":
+        # Sin GPU, el forward es matmul fp32 sobre las capas Linear; la
+        # cuantización dinámica a int8 las acelera ~2x con pérdida de
+        # precisión despreciable para 3 clases
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    if device == "cuda":
+        # fp16: mitad de bytes por peso desde HBM y Tensor Cores activos;
+        # los logits se devuelven a fp32 antes de la softmax
+        model = model.half()
+
+    if device == "cuda" and hasattr(torch, "compile"):
+        # Kernels fusionados y menos overhead por lanzamiento; dynamic=False
+        # porque predict() rellena siempre a 512 tokens (forma estática)
+        try:
+            model = torch.compile(model, mode="reduce-overhead", dynamic=False)
+            # Absorber el costo de compilación aquí (carga cacheada) y no
+            # en el primer click del usuario
+            dummy_ids = torch.zeros(1, 512, dtype=torch.long, device=device)
+            dummy_mask = torch.ones_like(dummy_ids)
+            with torch.no_grad():
+                for _ in range(2):
+                    model(input_ids=dummy_ids, attention_mask=dummy_mask)
+        except Exception:
+            pass  # fallback a eager
+
     return model, tokenizer, device
 
 
-def predict(text: str, model, tokenizer, device):
-    """Realiza predicción sobre un texto."""
-    encoding = tokenizer(
-        text,
+@lru_cache(maxsize=4)
+def _encoder_for(tokenizer, device):
+    """
+    Partial del tokenizer con la configuración fijada una sola vez:
+    cada predicción llama encode([texto]) sin re-resolver los kwargs.
+    """
+    if device == "onnx":
+        return partial(
+            tokenizer, truncation=True, max_length=512, return_tensors="np"
+        )
+    # En GPU se rellena a 512 fijo para que el modelo compilado vea una
+    # forma estática (evita recompilaciones); en CPU, solo lo necesario
+    return partial(
+        tokenizer,
         truncation=True,
-        padding=True,
+        padding="max_length" if device == "cuda" else True,
         max_length=512,
         return_tensors="pt"
     )
-    
-    encoding = {k: v.to(device) for k, v in encoding.items()}
-    
-    with torch.no_grad():
-        outputs = model(**encoding)
-        probs = F.softmax(outputs.logits, dim=-1)
-    
-    probs = probs.cpu().numpy()[0]
+
+
+def predict(text: str, model, tokenizer, device):
+    """Realiza predicción sobre un texto."""
+    if device == "onnx":
+        # Sesión de ONNX Runtime: entrada/salida en numpy, sin tensores torch
+        # (lista de un elemento: el tokenizer Rust optimiza la ruta batched)
+        encoding = _encoder_for(tokenizer, device)([text])
+        input_names = {i.name for i in model.get_inputs()}
+        inputs = {k: v for k, v in encoding.items() if k in input_names}
+        logits = model.run(None, inputs)[0][0]
+
+        exp = np.exp(logits - logits.max())
+        probs = exp / exp.sum()
+    else:
+        probs = _predict_torch(text, model, tokenizer, device)
+
     predicted_class = probs.argmax()
-    
+
     # Mapear a nombres de categoría
     label_map = {0: "arete", 1: "politica_poder", 2: "dioses_hombres"}
     category = label_map[predicted_class]
     confidence = float(probs[predicted_class])
-    
+
     return category, confidence, probs
 
 
+def _predict_torch(text: str, model, tokenizer, device):
+    """Forward con PyTorch; devuelve el vector de probabilidades."""
+    encoding = _encoder_for(tokenizer, device)([text])
+    
+    if device == "cuda":
+        # Memoria pinned + copia asíncrona: la transferencia H2D no bloquea
+        encoding = {
+            k: v.pin_memory().to(device, non_blocking=True)
+            for k, v in encoding.items()
+        }
+
+    # inference_mode es más barato que no_grad (sin bookkeeping de autograd)
+    with torch.inference_mode():
+        outputs = model(**encoding)
+        # Softmax en fp32 sobre el vector de 3 logits, aún en el dispositivo
+        probs = F.softmax(outputs.logits.float(), dim=-1)
+
+    return probs.cpu().numpy()[0]
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def predict_cached(text: str):
+    """
+    Predicción cacheada por texto: re-clicks sobre el mismo fragmento
+    devuelven el resultado al instante en lugar de repetir el forward.
+    El modelo sale del cache de recursos (load_model), no de esta clave.
+    """
+    model, tokenizer, device = load_model()
+    return predict(text, model, tokenizer, device)
+
+
 def main():
     # Título
     st.markdown("<h1>📚 Clasificador de Textos Clásicos</h1>", unsafe_allow_html=True)
@@ -242,7 +240,7 @@ def main():
     # Realizar predicción
     if analyze_button and text_input.strip():
         with st.spinner("Analizando texto..."):
-            category, confidence, all_probs = predict(text_input, model, tokenizer, device)
+            category, confidence, all_probs = predict_cached(text_input)
         
         cat_info = CATEGORY_INFO[category]
         
@@ -259,19 +257,38 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        # Mostrar todas las probabilidades
+        # Mostrar todas las probabilidades en un solo render (un frame de
+        # websocket en lugar de dos por categoría)
         st.markdown("#### Distribución de probabilidades")
-        
-        for idx, (cat_key, prob) in enumerate(zip(["arete", "politica_poder", "dioses_hombres"], all_probs)):
-            cat = CATEGORY_INFO[cat_key]
-            color = "#50fa7b" if cat_key == "arete" else "#ff79c6" if cat_key == "politica_poder" else "#8be9fd"
-            st.markdown(f"""
-            <div style="margin: 0.5rem 0;">
-                <span style="color: {color}; font-family: 'Crimson Pro', serif;">{cat['display']}</span>
-                <span style="color: #778da9; float: right;">{prob*100:.1f}%</span>
-            </div>
-            """, unsafe_allow_html=True)
-            st.progress(float(prob))
+
+        cat_keys = ["arete", "politica_poder", "dioses_hombres"]
+        cat_colors = ["#50fa7b", "#ff79c6", "#8be9fd"]
+        df_probs = pd.DataFrame({
+            "Categoría": [CATEGORY_INFO[k]["display"] for k in cat_keys],
+            "Probabilidad": [float(p) * 100 for p in all_probs]
+        })
+        chart = (
+            alt.Chart(df_probs)
+            .mark_bar()
+            .encode(
+                x=alt.X(
+                    "Probabilidad",
+                    scale=alt.Scale(domain=[0, 100]),
+                    title="Probabilidad (%)"
+                ),
+                y=alt.Y("Categoría", sort=None, title=""),
+                color=alt.Color(
+                    "Categoría",
+                    scale=alt.Scale(
+                        domain=df_probs["Categoría"].tolist(),
+                        range=cat_colors
+                    ),
+                    legend=None
+                ),
+                tooltip=["Categoría", alt.Tooltip("Probabilidad", format=".1f")]
+            )
+        )
+        st.altair_chart(chart, use_container_width=True)
     
     elif analyze_button:
         st.warning("Por favor, ingresa un texto para analizar.")
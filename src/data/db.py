@@ -4,6 +4,7 @@ Gestiona la conexión, creación de base de datos y colecciones.
 """
 
 import os
+import threading
 from pymongo import MongoClient
 from pymongo.database import Database
 from pymongo.collection import Collection
@@ -26,18 +27,33 @@ COLLECTIONS = {
 }
 
 _client: MongoClient = None
+_client_lock = threading.Lock()
 
 
 def get_client() -> MongoClient:
-    """Obtiene o crea la conexión al cliente de MongoDB."""
+    """Obtiene o crea la conexión al cliente de MongoDB (thread-safe)."""
     global _client
     if _client is None:
-        if not MONGO_URI:
-            raise ValueError(
-                "MONGO_URI no está configurado. "
-                "Crea un archivo .env con tu cadena de conexión."
-            )
-        _client = MongoClient(MONGO_URI)
+        # Double-checked locking: dos hilos concurrentes (p. ej. workers de
+        # Streamlit) no deben abrir dos clientes
+        with _client_lock:
+            if _client is None:
+                if not MONGO_URI:
+                    raise ValueError(
+                        "MONGO_URI no está configurado. "
+                        "Crea un archivo .env con tu cadena de conexión."
+                    )
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=16,
+                    minPoolSize=2,
+                    # Comprimir el wire protocol abarata mucho los documentos
+                    # de texto contra Atlas; pymongo usa el primero disponible
+                    compressors="zstd,snappy,zlib",
+                    retryWrites=True,
+                    serverSelectionTimeoutMS=3000,
+                    socketTimeoutMS=10000,
+                )
     return _client
 
 
@@ -76,7 +92,17 @@ def init_database() -> dict:
         if collection_name not in existing_collections:
             db.create_collection(collection_name)
             created.append(collection_name)
-    
+
+    # Índices para las consultas por categoría de las fases posteriores
+    # (distribuciones, filtros); create_index es idempotente
+    for collection_name in COLLECTIONS.values():
+        db[collection_name].create_index("categoria")
+
+    # Índice hashed sobre el texto crudo: lookups de deduplicación por
+    # igualdad sin indexar el contenido completo (los textos superan el
+    # límite de clave de un índice B-tree normal)
+    db[COLLECTIONS["raw_texts"]].create_index([("texto", "hashed")])
+
     return {
         "database": DB_NAME,
         "existing_collections": existing_collections,
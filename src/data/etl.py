@@ -3,14 +3,25 @@ Pipeline ETL para extracción de datos de Excel con estructuras heterogéneas.
 Implementa detección difusa de nombres de hojas y columnas.
 """
 
+import importlib.util
 import os
+import queue
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz
+from rapidfuzz import fuzz, process
 from .db import get_collection, clear_collection
 
+# Engine para leer Excel: calamine (parser en Rust, 5-20x mas rapido que
+# openpyxl) si esta instalado; None deja que pandas use el engine por defecto.
+# find_spec solo consulta el path, sin pagar el import del modulo
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
 # Mapeo de categorías canónicas
 CATEGORY_PATTERNS = {
     "arete": ["areté", "arete", "arété", "etiqueta areté", "etiqueta arete"],
@@ -45,6 +56,10 @@ CATEGORY_PATTERNS = {
     ]
 }
 
+# Tamaño de lote para las inserciones en MongoDB (limita RAM y respeta el
+# límite de 16MB por comando BSON)
+INSERT_BATCH_SIZE = 1000
+
 # Palabras clave para detectar columnas
 COLUMN_KEYWORDS = {
     "canto": ["canto", "número de canto", "numero de canto", "n° canto", "nº canto"],
@@ -53,87 +68,138 @@ COLUMN_KEYWORDS = {
 }
 
 
+# Tabla de traducción para quitar acentos en una sola pasada en C
+# (reemplaza la cadena de seis str.replace, cada uno con su copia intermedia)
+_ACCENT_TABLE = str.maketrans("áéíóúüñÁÉÍÓÚÜÑ", "aeiouunAEIOUUN")
+
+# Regex compiladas una sola vez (re.sub paga un lookup de cache por llamada)
+_ABBR_RE = re.compile(r'([a-z])\.')
+_SPACES_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
 def normalize_text(text: str) -> str:
-    """Normaliza texto para comparación (minúsculas, sin acentos extra)."""
+    """
+    Normaliza texto para comparación (minúsculas, sin acentos extra).
+
+    Cacheada por cadena de entrada: los nombres de hoja y encabezados se
+    repiten por todo el dataset, así que la mayoría de llamadas resuelve
+    con un lookup de dict.
+    """
     if not isinstance(text, str):
         return ""
     text = text.lower().strip()
-    
+
     # Normalizar acentos
-    text = text.replace("á", "a").replace("é", "e").replace("í", "i")
-    text = text.replace("ó", "o").replace("ú", "u").replace("ñ", "n")
-    
+    text = text.translate(_ACCENT_TABLE)
+
     # Remover puntos de abreviaciones (H. -> H, D. -> D)
-    text = re.sub(r'([a-z])\.', r'\1', text)
-    
+    text = _ABBR_RE.sub(r'\1', text)
+
     # Normalizar espacios múltiples a uno solo
-    text = re.sub(r'\s+', ' ', text)
-    
+    text = _SPACES_RE.sub(' ', text)
+
     # Remover espacios al final
     text = text.strip()
-    
+
     return text
 
 
+def _build_choices(patterns_by_name: Dict[str, List[str]]) -> Tuple[List[str], List[str]]:
+    """Aplana un mapeo nombre→patrones normalizando cada patrón una vez."""
+    choices: List[str] = []
+    by_index: List[str] = []
+    for name, patterns in patterns_by_name.items():
+        for pattern in patterns:
+            choices.append(normalize_text(pattern))
+            by_index.append(name)
+    return choices, by_index
+
+
+# Patrones normalizados una sola vez al importar el módulo: los loops
+# calientes comparan contra estas listas planas (índice → nombre canónico)
+# sin re-normalizar cada patrón en cada llamada
+_CATEGORY_CHOICES, _CATEGORY_BY_INDEX = _build_choices(CATEGORY_PATTERNS)
+_COLUMN_CHOICES, _COLUMN_BY_INDEX = _build_choices(COLUMN_KEYWORDS)
+
+# Atajo O(1) para el caso común: la hoja/columna usa la grafía canónica
+# y no hace falta Levenshtein
+_EXACT_CATEGORY = dict(zip(_CATEGORY_CHOICES, _CATEGORY_BY_INDEX))
+_EXACT_COLUMN = dict(zip(_COLUMN_CHOICES, _COLUMN_BY_INDEX))
+
+
+@lru_cache(maxsize=1024)
 def fuzzy_match_category(sheet_name: str, threshold: int = 65) -> Optional[str]:
     """
     Encuentra la categoría canónica que mejor coincide con el nombre de la hoja.
-    
+
+    Cacheada por (nombre, threshold): los mismos encabezados se repiten en
+    todas las hojas y archivos del dataset.
+
     Args:
         sheet_name: Nombre de la hoja de Excel
         threshold: Umbral mínimo de similitud (0-100)
-    
+
     Returns:
         Categoría canónica o None si no hay coincidencia
     """
     normalized_name = normalize_text(sheet_name)
-    best_match = None
-    best_score = 0
-    
-    # Probar con diferentes métodos de fuzzy matching para mejor precisión
-    for category, patterns in CATEGORY_PATTERNS.items():
-        for pattern in patterns:
-            normalized_pattern = normalize_text(pattern)
-            
-            # Usar ratio (similitud general)
-            score_ratio = fuzz.ratio(normalized_name, normalized_pattern)
-            
-            # Usar partial_ratio (substring matching)
-            score_partial = fuzz.partial_ratio(normalized_name, normalized_pattern)
-            
-            # Tomar el mejor de los dos
-            score = max(score_ratio, score_partial)
-            
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = category
-    
-    return best_match
 
+    # Coincidencia exacta: lookup de dict en vez de Levenshtein
+    exact = _EXACT_CATEGORY.get(normalized_name)
+    if exact is not None:
+        return exact
+
+    # Igual que antes: mejor score entre ratio (similitud general) y
+    # partial_ratio (substring). score_cutoff activa el descarte temprano
+    # en C++ (incluido el filtro por diferencia de longitudes: pares que
+    # no pueden alcanzar el umbral ni siquiera corren el DP)
+    best = process.extractOne(
+        normalized_name, _CATEGORY_CHOICES,
+        scorer=fuzz.ratio, score_cutoff=threshold
+    )
+    # Con score perfecto no hay nada que mejorar: ahorra la pasada de
+    # partial_ratio completa
+    if best is not None and best[1] >= 100:
+        return _CATEGORY_BY_INDEX[best[2]]
+
+    partial = process.extractOne(
+        normalized_name, _CATEGORY_CHOICES,
+        scorer=fuzz.partial_ratio, score_cutoff=threshold
+    )
+    if partial is not None and (best is None or partial[1] > best[1]):
+        best = partial
+
+    return _CATEGORY_BY_INDEX[best[2]] if best else None
 
+
+@lru_cache(maxsize=1024)
 def fuzzy_match_column(column_name: str, threshold: int = 60) -> Optional[str]:
     """
     Encuentra el nombre de columna canónico que mejor coincide.
-    
+
+    Cacheada por (nombre, threshold), igual que fuzzy_match_category.
+
     Args:
         column_name: Nombre de la columna en el Excel
         threshold: Umbral mínimo de similitud
-    
+
     Returns:
         Nombre canónico de columna o None
     """
     normalized_name = normalize_text(str(column_name))
-    best_match = None
-    best_score = 0
-    
-    for canonical, keywords in COLUMN_KEYWORDS.items():
-        for keyword in keywords:
-            score = fuzz.ratio(normalized_name, normalize_text(keyword))
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = canonical
-    
-    return best_match
+
+    # Coincidencia exacta: lookup de dict en vez de Levenshtein
+    exact = _EXACT_COLUMN.get(normalized_name)
+    if exact is not None:
+        return exact
+
+    best = process.extractOne(
+        normalized_name, _COLUMN_CHOICES,
+        scorer=fuzz.ratio, score_cutoff=threshold
+    )
+
+    return _COLUMN_BY_INDEX[best[2]] if best else None
 
 
 def find_header_row(df: pd.DataFrame, max_rows: int = 20) -> Tuple[int, Dict[str, str]]:
@@ -147,22 +213,41 @@ def find_header_row(df: pd.DataFrame, max_rows: int = 20) -> Tuple[int, Dict[str
     Returns:
         Tuple (índice_fila, mapeo_columnas)
     """
-    for row_idx in range(min(max_rows, len(df))):
-        row = df.iloc[row_idx]
-        column_mapping = {}
-        
-        for col_idx, cell_value in enumerate(row):
-            if pd.isna(cell_value):
-                continue
-            
-            canonical = fuzzy_match_column(str(cell_value))
-            if canonical:
-                column_mapping[canonical] = col_idx
-        
-        # Necesitamos al menos "texto" para considerarlo válido
-        if "texto" in column_mapping:
+    limit = min(max_rows, len(df))
+    if limit == 0:
+        return -1, {}
+
+    # Todas las celdas candidatas (las primeras max_rows filas) se comparan
+    # contra todas las palabras clave en una sola llamada C: una matriz
+    # celdas x keywords en lugar de un fuzzy_match_column por celda
+    arr = df.iloc[:limit].to_numpy(dtype=object)
+    rows, cols = np.nonzero(~pd.isna(arr))
+    if len(rows) == 0:
+        return -1, {}
+
+    values = [normalize_text(str(v)) for v in arr[rows, cols]]
+    scores = process.cdist(
+        values, _COLUMN_CHOICES, scorer=fuzz.ratio, score_cutoff=60
+    )
+    best_keyword = scores.argmax(axis=1)
+    best_score = scores[np.arange(len(values)), best_keyword]
+
+    # Reconstruir el mapeo por fila (el orden fila-columna de np.nonzero
+    # replica el recorrido original, celdas posteriores sobreescriben)
+    mappings: Dict[int, Dict[str, int]] = {}
+    for row_idx, col_idx, keyword_idx, score in zip(
+        rows, cols, best_keyword, best_score
+    ):
+        if score >= 60:
+            mapping = mappings.setdefault(int(row_idx), {})
+            mapping[_COLUMN_BY_INDEX[int(keyword_idx)]] = int(col_idx)
+
+    # Necesitamos al menos "texto" para considerar válida una fila
+    for row_idx in range(limit):
+        column_mapping = mappings.get(row_idx)
+        if column_mapping and "texto" in column_mapping:
             return row_idx, column_mapping
-    
+
     return -1, {}
 
 
@@ -179,19 +264,31 @@ def detect_multi_table_layout(df: pd.DataFrame, max_scan_rows: int = 10) -> Opti
     """
     # Buscar fila con títulos de categorías
     for row_idx in range(min(max_scan_rows, len(df))):
-        row = df.iloc[row_idx]
-        
-        # Buscar celdas que coincidan con nombres de categorías
+        row = df.iloc[row_idx].to_numpy(dtype=object)
+        col_indices = np.flatnonzero(pd.notna(row))
+        if len(col_indices) == 0:
+            continue
+
+        # Comparar todas las celdas de la fila contra todos los patrones en
+        # dos llamadas cdist (ratio y partial_ratio, como el matcher por
+        # celda) y quedarse con el mejor score por par celda-patrón.
+        # Threshold más alto (75) para evitar falsos positivos
+        values = [normalize_text(str(row[c])) for c in col_indices]
+        scores = np.maximum(
+            process.cdist(
+                values, _CATEGORY_CHOICES, scorer=fuzz.ratio, score_cutoff=75
+            ),
+            process.cdist(
+                values, _CATEGORY_CHOICES,
+                scorer=fuzz.partial_ratio, score_cutoff=75
+            )
+        )
+
         category_columns = {}
-        
-        for col_idx, cell_value in enumerate(row):
-            if pd.isna(cell_value):
-                continue
-            
-            # Usar threshold más alto para evitar falsos positivos
-            category = fuzzy_match_category(str(cell_value), threshold=75)
-            if category:
-                category_columns[category] = col_idx
+        for i, col_idx in enumerate(col_indices):
+            best_pattern = int(scores[i].argmax())
+            if scores[i][best_pattern] >= 75:
+                category_columns[_CATEGORY_BY_INDEX[best_pattern]] = int(col_idx)
         
         # Criterios estrictos para formato multi-tabla:
         # 1. Al menos 3 categorías (las 3 deben estar presentes)
@@ -218,21 +315,25 @@ def detect_multi_table_layout(df: pd.DataFrame, max_scan_rows: int = 10) -> Opti
 def extract_multi_table_data(
     df: pd.DataFrame,
     source_file: str,
-    sheet_name: str
+    sheet_name: str,
+    layout_info: Optional[Dict] = None
 ) -> List[Dict]:
     """
     Extrae datos de una hoja con múltiples tablas en paralelo.
-    
+
     Args:
         df: DataFrame de la hoja
         source_file: Nombre del archivo fuente
         sheet_name: Nombre de la hoja original
-    
+        layout_info: Layout ya detectado (evita re-escanear la hoja);
+            si es None se detecta aquí
+
     Returns:
         Lista de documentos de todas las tablas
     """
-    # Detectar el layout
-    layout_info = detect_multi_table_layout(df)
+    # Detectar el layout solo si el caller no lo trae ya calculado
+    if layout_info is None:
+        layout_info = detect_multi_table_layout(df)
     if not layout_info:
         return []
     
@@ -244,95 +345,83 @@ def extract_multi_table_data(
         print(f"        • {cat} en columna {col}")
     
     all_documents = []
-    
+
+    # Una sola conversión a ndarray + máscara de NaN por hoja: el acceso
+    # arr[fila, col] es O(1) en C, sin materializar Series por fila
+    arr = df.to_numpy(dtype=object)
+    nan_mask = pd.isna(arr)
+    num_rows, num_cols = arr.shape
+
     # Procesar cada tabla por separado
     for category, start_col in categories.items():
         # Buscar encabezados (fila después del título de categoría)
         header_found = False
         header_row_idx = -1
         column_mapping = {}
-        
+
         # Buscar en las siguientes 5 filas después del título
         for offset in range(1, 6):
             check_row = category_row + offset
-            if check_row >= len(df):
+            if check_row >= num_rows:
                 break
-            
-            row = df.iloc[check_row]
+
             temp_mapping = {}
-            
+
             # Buscar en un rango de 7 columnas a partir de start_col
-            for col_offset in range(7):
-                col_idx = start_col + col_offset
-                if col_idx >= len(row):
-                    break
-                
-                cell_value = row.iloc[col_idx]
-                if pd.isna(cell_value):
+            for col_idx in range(start_col, min(start_col + 7, num_cols)):
+                if nan_mask[check_row, col_idx]:
                     continue
-                
-                canonical = fuzzy_match_column(str(cell_value))
+
+                canonical = fuzzy_match_column(str(arr[check_row, col_idx]))
                 if canonical:
                     temp_mapping[canonical] = col_idx
-            
+
             # Si encontramos al menos "texto", es una fila de encabezados válida
             if "texto" in temp_mapping:
                 header_row_idx = check_row
                 column_mapping = temp_mapping
                 header_found = True
                 break
-        
+
         if not header_found:
             print(f"        ⚠ No se encontraron encabezados para {category}")
             continue
-        
-        # Extraer datos (después de la fila de encabezados)
+
+        # Extraer datos (después de la fila de encabezados) por columnas
         data_start_row = header_row_idx + 1
+        texto_col = column_mapping["texto"]
+
+        keep = ~nan_mask[data_start_row:, texto_col]
+        textos = arr[data_start_row:, texto_col][keep]
+
+        def _column_values(canonical: str) -> np.ndarray:
+            col = column_mapping.get(canonical)
+            if col is None:
+                return np.full(len(textos), None, dtype=object)
+            values = arr[data_start_row:, col][keep].copy()
+            values[pd.isna(values)] = None
+            return values
+
+        cantos = _column_values("canto")
+        versos = _column_values("versos")
+
         count = 0
-        
-        for row_idx in range(data_start_row, len(df)):
-            row = df.iloc[row_idx]
-            
-            # Extraer texto
-            texto_col = column_mapping.get("texto")
-            if texto_col is None:
+        for texto, canto, verso in zip(textos, cantos, versos):
+            texto = str(texto).strip()
+            if not texto:
                 continue
-            
-            texto = row.iloc[texto_col] if texto_col < len(row) else None
-            
-            # Saltar si no hay texto
-            if pd.isna(texto) or str(texto).strip() == "":
-                continue
-            
-            # Extraer campos opcionales
-            canto = None
-            versos = None
-            
-            if "canto" in column_mapping:
-                canto_col = column_mapping["canto"]
-                if canto_col < len(row):
-                    canto_val = row.iloc[canto_col]
-                    canto = str(canto_val) if not pd.isna(canto_val) else None
-            
-            if "versos" in column_mapping:
-                versos_col = column_mapping["versos"]
-                if versos_col < len(row):
-                    versos_val = row.iloc[versos_col]
-                    versos = str(versos_val) if not pd.isna(versos_val) else None
-            
-            doc = {
-                "texto": str(texto).strip(),
+            all_documents.append({
+                "texto": texto,
                 "categoria": category,
                 "fuente": source_file,
                 "hoja_original": sheet_name,
-                "canto": canto,
-                "versos": versos
-            }
-            all_documents.append(doc)
+                "canto": str(canto) if canto is not None else None,
+                "versos": str(verso) if verso is not None else None
+            })
             count += 1
-        
+
         print(f"        ✓ {count} registros de {category}")
-    
+
     return all_documents
 
 
@@ -356,53 +445,55 @@ def extract_sheet_data(
     """
     # Buscar fila de encabezados
     header_row, column_mapping = find_header_row(df)
-    
+
     if header_row == -1:
         print(f"  ⚠ No se encontraron encabezados válidos en '{sheet_name}'")
         return []
-    
-    # Crear DataFrame con datos reales (después de encabezados)
-    data_df = df.iloc[header_row + 1:].reset_index(drop=True)
-    
+
+    texto_col = column_mapping.get("texto")
+    if texto_col is None:
+        return []
+
+    # Datos reales (después de encabezados), como columnas NumPy: evita
+    # materializar una Series por fila con iterrows
+    data_df = df.iloc[header_row + 1:]
+    textos = data_df.iloc[:, texto_col].to_numpy(dtype=object)
+    num_rows = len(textos)
+
+    def _column_values(canonical: str) -> np.ndarray:
+        col = column_mapping.get(canonical)
+        if col is None or col >= data_df.shape[1]:
+            return np.full(num_rows, None, dtype=object)
+        # Una máscara pd.isna vectorizada por columna en lugar de un
+        # pd.isna escalar (con su dispatch de pandas) por fila
+        values = data_df.iloc[:, col].to_numpy(dtype=object).copy()
+        values[pd.isna(values)] = None
+        return values
+
+    cantos = _column_values("canto")
+    versos = _column_values("versos")
+
+    # Filtrar filas sin texto y normalizar en vectorizado: primero la
+    # máscara de NaN, luego strip + descarte de vacíos a nivel pandas/C
+    keep = pd.notna(textos)
+    textos_str = pd.Series(textos[keep], dtype=object).astype(str).str.strip()
+    nonempty = (textos_str != "").to_numpy()
+
+    textos_final = textos_str.to_numpy(dtype=object)[nonempty]
+    cantos_final = cantos[keep][nonempty]
+    versos_final = versos[keep][nonempty]
+
     documents = []
-    for _, row in data_df.iterrows():
-        # Extraer texto (obligatorio)
-        texto_col = column_mapping.get("texto")
-        if texto_col is None:
-            continue
-            
-        texto = row.iloc[texto_col] if texto_col < len(row) else None
-        
-        # Saltar filas sin texto
-        if pd.isna(texto) or str(texto).strip() == "":
-            continue
-        
-        # Extraer campos opcionales
-        canto = None
-        versos = None
-        
-        if "canto" in column_mapping:
-            canto_col = column_mapping["canto"]
-            if canto_col < len(row):
-                canto_val = row.iloc[canto_col]
-                canto = str(canto_val) if not pd.isna(canto_val) else None
-        
-        if "versos" in column_mapping:
-            versos_col = column_mapping["versos"]
-            if versos_col < len(row):
-                versos_val = row.iloc[versos_col]
-                versos = str(versos_val) if not pd.isna(versos_val) else None
-        
-        doc = {
-            "texto": str(texto).strip(),
+    for texto, canto, verso in zip(textos_final, cantos_final, versos_final):
+        documents.append({
+            "texto": texto,
             "categoria": category,
             "fuente": source_file,
             "hoja_original": sheet_name,
-            "canto": canto,
-            "versos": versos
-        }
-        documents.append(doc)
-    
+            "canto": str(canto) if canto is not None else None,
+            "versos": str(verso) if verso is not None else None
+        })
+
     return documents
 
 
@@ -422,20 +513,24 @@ def process_excel_file(file_path: Path, debug: bool = False) -> List[Dict]:
     all_documents = []
     
     try:
-        # Cargar todas las hojas sin encabezados
-        xlsx = pd.ExcelFile(file_path)
-        
-        for sheet_name in xlsx.sheet_names:
-            # Cargar hoja sin encabezados
-            df = pd.read_excel(xlsx, sheet_name=sheet_name, header=None)
-            
+        # Cargar todas las hojas sin encabezados en una sola pasada:
+        # el archivo (zip + XML) se parsea una única vez
+        sheets = pd.read_excel(
+            file_path, sheet_name=None, header=None, engine=EXCEL_ENGINE
+        )
+
+        for sheet_name, df in sheets.items():
+
             # Primero, intentar detectar formato multi-tabla
             multi_table_layout = detect_multi_table_layout(df)
             
             if multi_table_layout:
                 # Formato multi-tabla detectado (como archivo 4)
                 print(f"  📊 Hoja '{sheet_name}' contiene múltiples tablas")
-                documents = extract_multi_table_data(df, file_path.name, sheet_name)
+                documents = extract_multi_table_data(
+                    df, file_path.name, sheet_name,
+                    layout_info=multi_table_layout
+                )
                 all_documents.extend(documents)
                 print(f"     ✓ Total: {len(documents)} registros extraídos")
             else:
@@ -448,8 +543,12 @@ def process_excel_file(file_path: Path, debug: bool = False) -> List[Dict]:
                         normalized = normalize_text(sheet_name)
                         print(f"  ⚠ Hoja '{sheet_name}' (normalizada: '{normalized}') no coincide")
                         print(f"     Mejores scores:")
-                        for cat, patterns in CATEGORY_PATTERNS.items():
-                            best = max(fuzz.partial_ratio(normalized, normalize_text(p)) for p in patterns)
+                        for cat in CATEGORY_PATTERNS:
+                            best = max(
+                                fuzz.partial_ratio(normalized, p)
+                                for p, c in zip(_CATEGORY_CHOICES, _CATEGORY_BY_INDEX)
+                                if c == cat
+                            )
                             print(f"       - {cat}: {best}")
                     else:
                         print(f"  ⚠ Hoja '{sheet_name}' no coincide con ninguna categoría - saltando")
@@ -472,18 +571,63 @@ def process_excel_file(file_path: Path, debug: bool = False) -> List[Dict]:
     return all_documents
 
 
+def _mongo_writer(
+    doc_queue: "queue.Queue",
+    collection,
+    result: Dict,
+    batch_size: int = INSERT_BATCH_SIZE
+) -> None:
+    """
+    Consume documentos de la cola y los inserta en MongoDB por lotes.
+
+    Corre en un hilo aparte para solapar la inserción (IO de red) con el
+    parseo de los Excel. Un None en la cola indica fin de datos.
+    """
+    buffer = []
+    try:
+        while True:
+            doc = doc_queue.get()
+            if doc is None:
+                break
+            buffer.append(doc)
+            if len(buffer) >= batch_size:
+                inserted = collection.insert_many(
+                    buffer, ordered=False, bypass_document_validation=True
+                )
+                result["inserted"] += len(inserted.inserted_ids)
+                buffer = []
+        if buffer:
+            inserted = collection.insert_many(
+                buffer, ordered=False, bypass_document_validation=True
+            )
+            result["inserted"] += len(inserted.inserted_ids)
+    except Exception as exc:
+        result["error"] = exc
+        # Seguir drenando la cola hasta el sentinela: si el escritor muere
+        # sin consumir, el productor quedaría bloqueado en una cola llena
+        while doc_queue.get() is not None:
+            pass
+
+
 def run_etl_pipeline(
     dataset_path: str = "Dataset",
     clear_existing: bool = True,
-    debug: bool = False
+    debug: bool = False,
+    batch_size: int = INSERT_BATCH_SIZE
 ) -> Dict:
     """
     Ejecuta el pipeline ETL completo.
-    
+
+    Los documentos fluyen hacia MongoDB a medida que se extraen (cola
+    acotada + hilo escritor), por lo que el pico de memoria es O(archivo
+    más grande + lotes en vuelo), no O(corpus completo).
+
+
     Args:
         dataset_path: Ruta a la carpeta con archivos Excel
         clear_existing: Si True, limpia la colección antes de insertar
         debug: Si True, muestra información de debugging
+        batch_size: Documentos por insert_many del hilo escritor
     
     Returns:
         Estadísticas de la migración
@@ -496,8 +640,13 @@ def run_etl_pipeline(
     if not dataset_dir.exists():
         raise FileNotFoundError(f"No se encontró el directorio: {dataset_path}")
     
-    # Obtener archivos Excel
-    excel_files = sorted(list(dataset_dir.glob("*.xlsx")))
+    # Obtener archivos Excel (os.scandir evita el stat por entrada de glob)
+    with os.scandir(dataset_dir) as entries:
+        excel_files = sorted(
+            dataset_dir / entry.name
+            for entry in entries
+            if entry.name.endswith(".xlsx") and entry.is_file(follow_symlinks=False)
+        )
     print(f"\n📁 Archivos encontrados: {len(excel_files)}")
     
     # Limpiar colección si se solicita
@@ -505,26 +654,46 @@ def run_etl_pipeline(
         deleted = clear_collection("raw_texts")
         print(f"🗑 Colección limpiada: {deleted} documentos eliminados")
     
-    # Procesar archivos
-    all_documents = []
+    # Procesar archivos (en paralelo si hay varios: cada archivo es
+    # independiente) y transmitir los documentos a un hilo escritor que
+    # inserta por lotes, acotando la memoria a unos pocos lotes en vuelo
     stats_by_category = {"arete": 0, "politica_poder": 0, "dioses_hombres": 0}
     stats_by_file = {}
-    
-    for file_path in excel_files:
-        documents = process_excel_file(file_path, debug=debug)
-        all_documents.extend(documents)
+
+    doc_queue: "queue.Queue" = queue.Queue(maxsize=batch_size * 4)
+    writer_result: Dict = {"inserted": 0}
+    writer = threading.Thread(
+        target=_mongo_writer,
+        args=(doc_queue, get_collection("raw_texts"), writer_result, batch_size),
+        daemon=True
+    )
+    writer.start()
+
+    def _consume(file_path: Path, documents: List[Dict]) -> None:
         stats_by_file[file_path.name] = len(documents)
-        
-        for doc in documents:
+        put = doc_queue.put  # local: un LOAD_FAST por documento en vez de
+        for doc in documents:  # dos lookups de atributo
             stats_by_category[doc["categoria"]] += 1
-    
-    # Insertar en MongoDB
-    if all_documents:
-        collection = get_collection("raw_texts")
-        result = collection.insert_many(all_documents)
-        inserted_count = len(result.inserted_ids)
+            put(doc)
+
+    # En modo debug se procesa en serie: el diagnostico por hoja se vuelve
+    # ilegible si varios workers intercalan sus prints
+    max_workers = 1 if debug else min(len(excel_files), os.cpu_count() or 1)
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(partial(process_excel_file, debug=debug), excel_files)
+            for file_path, documents in zip(excel_files, results):
+                _consume(file_path, documents)
     else:
-        inserted_count = 0
+        for file_path in excel_files:
+            _consume(file_path, process_excel_file(file_path, debug=debug))
+
+    # Señal de fin y espera a que el escritor vacíe la cola
+    doc_queue.put(None)
+    writer.join()
+    if "error" in writer_result:
+        raise writer_result["error"]
+    inserted_count = writer_result["inserted"]
     
     # Resumen
     print("\n" + "=" * 60)
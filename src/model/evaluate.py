@@ -5,7 +5,7 @@ Genera matriz de confusión y métricas detalladas.
 
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
@@ -30,14 +30,39 @@ REPORTS_DIR.mkdir(exist_ok=True)
 
 
 def load_model_and_tokenizer(model_path: Path = MODEL_PATH):
-    """Carga el modelo entrenado y su tokenizer."""
+    """
+    Carga el modelo entrenado y su tokenizer.
+
+    En GPU el modelo queda en fp16 y compilado con torch.compile; en CPU,
+    cuantizado a int8 dinámico. Para servir con ONNX Runtime está
+    scripts/07_export_onnx.py (la app lo consume automáticamente).
+    """
     tokenizer = AutoTokenizer.from_pretrained(model_path)
     model = AutoModelForSequenceClassification.from_pretrained(model_path)
     model.eval()
-    
+
     device = "cuda" if torch.cuda.is_available() else "cpu"
     model.to(device)
-    
+
+    # fp16 en GPU: mitad de ancho de banda por peso, ~2x de throughput,
+    # sin cambio apreciable en los logits de clasificación
+    if device == "cuda":
+        model = model.half()
+        # La evaluación repite una misma forma de batch: torch.compile
+        # amortiza su costo de compilación en el primer lote
+        if hasattr(torch, "compile"):
+            try:
+                model = torch.compile(model, mode="max-autotune")
+            except Exception:
+                pass  # fallback a eager
+    else:
+        # En CPU, cuantizar las capas Linear (las que dominan los FLOPs de
+        # BERT) a int8 dinámico: ~2-4x de throughput con pérdida de
+        # precisión despreciable para clasificación
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
     return model, tokenizer, device
 
 
@@ -46,9 +71,10 @@ def predict_batch(
     model,
     tokenizer,
     device: str,
-    batch_size: int = 16,
-    max_length: int = 512
-) -> Tuple[List[int], List[List[float]]]:
+    batch_size: int = 32,
+    max_length: int = 512,
+    return_probs: bool = False
+) -> Tuple[List[int], Optional[List[List[float]]]]:
     """
     Realiza predicciones en lotes.
     
@@ -59,35 +85,55 @@ def predict_batch(
         device: Dispositivo (cuda/cpu)
         batch_size: Tamaño del lote
         max_length: Longitud máxima de tokens
-    
+        return_probs: Si True, devuelve también las probabilidades
+            (transferencias GPU→CPU y memoria extra; None si es False)
+
     Returns:
-        Tuple (predicciones, probabilidades)
+        Tuple (predicciones, probabilidades o None)
     """
-    all_predictions = []
-    all_probabilities = []
-    
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i + batch_size]
-        
-        encodings = tokenizer(
-            batch_texts,
-            truncation=True,
-            padding=True,
-            max_length=max_length,
-            return_tensors="pt"
-        )
-        
-        encodings = {k: v.to(device) for k, v in encodings.items()}
-        
-        with torch.no_grad():
+    all_predictions: List = [None] * len(texts)
+    all_probabilities: Optional[List] = [None] * len(texts) if return_probs else None
+
+    # Agrupar textos de longitud similar: con padding dinámico, mezclar
+    # textos cortos y largos en un mismo lote desperdicia cómputo en PAD.
+    # len(texto) es un proxy suficiente del número de tokens
+    order = np.argsort([len(t) for t in texts], kind="stable")
+
+    # inference_mode es más barato que no_grad: desactiva por completo el
+    # bookkeeping de autograd (versiones y vistas de tensores)
+    with torch.inference_mode():
+        for i in range(0, len(order), batch_size):
+            batch_indices = order[i:i + batch_size]
+            batch_texts = [texts[j] for j in batch_indices]
+
+            # padding dinámico: cada lote se rellena solo hasta su texto
+            # más largo, no hasta max_length
+            # pad_to_multiple_of acota el conjunto de formas que ve el
+            # modelo compilado (y alinea los GEMM para Tensor Cores)
+            encodings = tokenizer(
+                batch_texts,
+                truncation=True,
+                padding="longest",
+                max_length=max_length,
+                pad_to_multiple_of=8,
+                return_tensors="pt"
+            )
+
+            encodings = {k: v.to(device) for k, v in encodings.items()}
+
             outputs = model(**encodings)
             logits = outputs.logits
-            probs = torch.softmax(logits, dim=-1)
             preds = torch.argmax(logits, dim=-1)
-        
-        all_predictions.extend(preds.cpu().numpy().tolist())
-        all_probabilities.extend(probs.cpu().numpy().tolist())
-    
+
+            # Devolver cada resultado a su posición original; la softmax y
+            # su transferencia a CPU solo se pagan si alguien las pidió
+            if return_probs:
+                probs = torch.softmax(logits.float(), dim=-1)
+                for j, prob in zip(batch_indices, probs.cpu().numpy().tolist()):
+                    all_probabilities[j] = prob
+            for j, pred in zip(batch_indices, preds.cpu().numpy().tolist()):
+                all_predictions[j] = pred
+
     return all_predictions, all_probabilities
 
 
@@ -180,19 +226,25 @@ def evaluate_model(model_path: Path = MODEL_PATH) -> Dict:
     model, tokenizer, device = load_model_and_tokenizer(model_path)
     print(f"   Dispositivo: {device}")
     
-    # Cargar datos de test
+    # Cargar datos de test: solo los dos campos necesarios, en streaming
+    # (sin materializar los documentos BSON completos)
     print("\n📥 Cargando datos de test desde MongoDB...")
     collection = get_collection("test_data")
-    documents = list(collection.find({}))
-    
-    texts = [doc["texto"] for doc in documents]
-    y_true = [doc["label"] for doc in documents]
+    cursor = collection.find(
+        {}, {"texto": 1, "label": 1, "_id": 0}
+    ).batch_size(256)
+
+    texts = []
+    y_true = []
+    for doc in cursor:
+        texts.append(doc["texto"])
+        y_true.append(doc["label"])
     
     print(f"   Muestras de test: {len(texts)}")
     
     # Realizar predicciones
     print("\n🔮 Generando predicciones...")
-    y_pred, probabilities = predict_batch(texts, model, tokenizer, device)
+    y_pred, _ = predict_batch(texts, model, tokenizer, device)
     
     # Calcular métricas
     print("\n📈 Calculando métricas...")
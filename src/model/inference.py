@@ -3,14 +3,21 @@ Módulo de inferencia para predicciones en tiempo real.
 Usado por la aplicación Streamlit y para predicciones batch.
 """
 
+import copy
+import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Union
+import numpy as np
 import torch
 import torch.nn.functional as F
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
 from src.config import CATEGORIES, LABEL_NAMES, ID_TO_DISPLAY, MODELS_DIR
 
+# Habilitar los hilos internos (Rayon) del tokenizer Rust
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+
 # Ruta por defecto del modelo
 DEFAULT_MODEL_PATH = MODELS_DIR / "clasificador_textos" / "final"
 
@@ -21,18 +28,25 @@ class TextClassifier:
     Wrapper para facilitar la inferencia.
     """
     
-    def __init__(self, model_path: Optional[Path] = None):
+    def __init__(self, model_path: Optional[Path] = None, quantize: bool = True):
         """
         Inicializa el clasificador.
-        
+
         Args:
             model_path: Ruta al modelo entrenado. Si es None, usa la ruta por defecto.
+            quantize: Si True, cuantiza a int8 dinámico las capas Linear
+                cuando se sirve en CPU (~2x más rápido, mitad de RAM).
         """
         self.model_path = model_path or DEFAULT_MODEL_PATH
         self.model = None
         self.tokenizer = None
         self.device = None
+        self.quantize = quantize
         self._loaded = False
+        self._traced = None
+        # El grafo ONNX exportado declara token_type_ids como entrada; el
+        # forward de BERT en PyTorch los rellena solo, así que ahí se omiten
+        self._return_token_type_ids = False
     
     def load(self) -> bool:
         """
@@ -48,22 +62,150 @@ class TextClassifier:
             return False
         
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-            self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+            # use_fast explícito: el tokenizer Python de fallback es
+            # órdenes de magnitud más lento
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.model_path, use_fast=True
+            )
+
+            # Si el modelo fue exportado a ONNX (scripts/07_export_onnx.py)
+            # y optimum está instalado, servir con ONNX Runtime: grafo con
+            # Attention/LayerNorm fusionados, mismo API de .logits
+            if (self.model_path / "model.onnx").exists():
+                try:
+                    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+                    self.model = ORTModelForSequenceClassification.from_pretrained(
+                        self.model_path
+                    )
+                    self.device = "cpu"  # ORT gestiona sus execution providers
+                    self._return_token_type_ids = True
+                    self._loaded = True
+                    return True
+                except ImportError:
+                    pass  # optimum no instalado: seguir con PyTorch
+
+            # attn_implementation="sdpa" enruta la atención por
+            # scaled_dot_product_attention (kernels fusionados, Flash
+            # Attention en GPUs recientes) en lugar de la atención eager
+            try:
+                self.model = AutoModelForSequenceClassification.from_pretrained(
+                    self.model_path, attn_implementation="sdpa"
+                )
+            except (TypeError, ValueError):
+                # transformers sin soporte SDPA para este modelo
+                self.model = AutoModelForSequenceClassification.from_pretrained(
+                    self.model_path
+                )
             self.model.eval()
             
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
             self.model.to(self.device)
-            
+
+            if self.device == "cuda":
+                # fp16: mitad de bytes por peso y matmuls en Tensor Cores;
+                # la softmax se calcula sobre los logits en fp32
+                self.model = self.model.half()
+
+            if self.device == "cpu" and self.quantize:
+                # Las Linear (proyecciones de atención + FFN) dominan los
+                # FLOPs de BERT; en int8 dinámico corren sobre GEMM int8
+                # (FBGEMM) con pérdida despreciable para clasificación.
+                # Embeddings y LayerNorm se mantienen en fp32
+                torch.backends.quantized.engine = "fbgemm"
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+
+            if self.device == "cuda" and hasattr(torch, "compile"):
+                # reduce-overhead captura CUDA Graphs por forma: como el
+                # padding va a múltiplos de 8, las formas se repiten y cada
+                # petición re-ejecuta un grafo grabado (decenas de kernels
+                # en un solo replay) en lugar de lanzarlos uno a uno
+                try:
+                    # dynamic por defecto (None): especializa las primeras
+                    # formas y generaliza después, en lugar de recompilar
+                    # por cada combinación batch x longitud
+                    self.model = torch.compile(self.model, mode="reduce-overhead")
+                except Exception:
+                    pass  # fallback a eager
+            else:
+                # En CPU, TorchScript (trace + freeze) cumple el rol análogo
+                self._trace_model()
+
             self._loaded = True
             return True
         except Exception as e:
             print(f"Error cargando modelo: {e}")
             return False
+
+    def _trace_model(self) -> None:
+        """
+        Congela el modelo con TorchScript (trace + freeze): fusiona los ops
+        elementwise (LayerNorm, GELU) y elimina el dispatch Python del
+        forward. Si el trace falla se mantiene el modelo eager.
+        """
+        try:
+            dummy = self.tokenizer(
+                "warmup", return_tensors="pt",
+                padding="max_length", max_length=128
+            )
+            ids = dummy["input_ids"].to(self.device)
+            mask = dummy["attention_mask"].to(self.device)
+
+            for param in self.model.parameters():
+                param.requires_grad_(False)
+
+            traced = torch.jit.trace(self.model, (ids, mask), strict=False)
+            traced = torch.jit.freeze(traced)
+
+            # Los dos primeros forwards hacen profiling y disparan la fusión
+            with torch.inference_mode():
+                traced(ids, mask)
+                traced(ids, mask)
+
+            self._traced = traced
+        except Exception:
+            self._traced = None  # fallback a eager
+
+    def _to_device(self, encoding) -> Dict:
+        """
+        Mueve los tensores del encoding al dispositivo. En CUDA usa memoria
+        pinned y copias non_blocking: la transferencia H2D va por el copy
+        engine sin bloquear el hilo (se solapa con la tokenización del
+        siguiente lote en predict_batch).
+        """
+        if self.device == "cuda":
+            return {
+                k: v.pin_memory().to(self.device, non_blocking=True)
+                for k, v in encoding.items()
+            }
+        return {k: v.to(self.device) for k, v in encoding.items()}
+
+    def _forward_logits(self, encoding: Dict) -> torch.Tensor:
+        """Forward por la vía congelada si existe; si no, eager."""
+        if self._traced is not None:
+            outputs = self._traced(
+                encoding["input_ids"], encoding["attention_mask"]
+            )
+            return outputs["logits"] if isinstance(outputs, dict) else outputs.logits
+        return self.model(**encoding).logits
     
+    def warmup(self) -> None:
+        """
+        Hace una predicción de calentamiento para mover los costos únicos
+        (carga del modelo, autotune de cuBLAS, profiling de TorchScript)
+        fuera de la primera petición real. Si el modelo aún no existe,
+        no hace nada: el caller verá el error al predecir de verdad.
+        """
+        try:
+            self.predict("warmup " * 8)
+        except RuntimeError:
+            pass
+
     def predict(
-        self, 
-        text: str, 
+        self,
+        text: str,
         return_all_scores: bool = False
     ) -> Dict:
         """
@@ -81,24 +223,30 @@ class TextClassifier:
                 raise RuntimeError("No se pudo cargar el modelo")
         
         # Tokenizar
+        # pad_to_multiple_of=8: dimensiones de GEMM alineadas para los
+        # Tensor Cores (y menos formas distintas para la vía congelada)
         encoding = self.tokenizer(
             text,
             truncation=True,
             padding=True,
             max_length=512,
+            pad_to_multiple_of=8,
+            return_token_type_ids=self._return_token_type_ids,
             return_tensors="pt"
         )
-        encoding = {k: v.to(self.device) for k, v in encoding.items()}
+        encoding = self._to_device(encoding)
         
-        # Inferencia
-        with torch.no_grad():
-            outputs = self.model(**encoding)
-            probs = F.softmax(outputs.logits, dim=-1)
-        
-        probs = probs.cpu().numpy()[0]
+        # Inferencia (inference_mode evita todo el bookkeeping de autograd,
+        # algo más barato que no_grad, sobre todo en CPU)
+        with torch.inference_mode():
+            logits = self._forward_logits(encoding)
+            probs = F.softmax(logits.float(), dim=-1)[0]
+
+        # argmax y confianza sobre el tensor; el vector completo solo se
+        # transfiere si el caller pidió todas las probabilidades
         predicted_id = int(probs.argmax())
         confidence = float(probs[predicted_id])
-        
+
         # Obtener información de la categoría
         category_key = LABEL_NAMES[predicted_id]
         category_info = CATEGORIES[category_key]
@@ -113,10 +261,10 @@ class TextClassifier:
         
         if return_all_scores:
             result["todas_probabilidades"] = {
-                CATEGORIES[LABEL_NAMES[i]]["display_name"]: float(p)
-                for i, p in enumerate(probs)
+                CATEGORIES[LABEL_NAMES[i]]["display_name"]: p
+                for i, p in enumerate(probs.cpu().tolist())
             }
-        
+
         return result
     
     def predict_batch(
@@ -138,39 +286,55 @@ class TextClassifier:
             if not self.load():
                 raise RuntimeError("No se pudo cargar el modelo")
         
-        results = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            
+        results: List[Optional[Dict]] = [None] * len(texts)
+
+        # Si todo entra en un solo lote, un único forward amortiza el
+        # overhead Python/lanzamiento de kernels y no hay nada que ordenar
+        if len(texts) <= batch_size:
+            order = np.arange(len(texts))
+        else:
+            # Lotes de longitud similar: con padding dinámico, mezclar
+            # textos cortos y largos desperdicia cómputo en tokens PAD.
+            # len() es un proxy suficiente del número de tokens
+            order = np.argsort([len(t) for t in texts], kind="stable")
+
+        for i in range(0, len(order), batch_size):
+            batch_indices = order[i:i + batch_size]
+            batch_texts = [texts[j] for j in batch_indices]
+
             # Tokenizar batch
             encoding = self.tokenizer(
                 batch_texts,
                 truncation=True,
                 padding=True,
                 max_length=512,
+                pad_to_multiple_of=8,
+                return_token_type_ids=self._return_token_type_ids,
                 return_tensors="pt"
             )
-            encoding = {k: v.to(self.device) for k, v in encoding.items()}
-            
-            # Inferencia
-            with torch.no_grad():
-                outputs = self.model(**encoding)
-                probs = F.softmax(outputs.logits, dim=-1)
+            encoding = self._to_device(encoding)
             
-            probs = probs.cpu().numpy()
-            
-            for prob in probs:
-                predicted_id = int(prob.argmax())
-                confidence = float(prob[predicted_id])
+            # Inferencia: la reducción max corre en el dispositivo y solo
+            # viajan a CPU dos vectores por lote (una sync, no una por fila)
+            with torch.inference_mode():
+                logits = self._forward_logits(encoding)
+                probs = F.softmax(logits.float(), dim=-1)
+                confidences, predicted = probs.max(dim=-1)
+
+            predicted = predicted.cpu().tolist()
+            confidences = confidences.cpu().tolist()
+
+            # Cada resultado vuelve a su posición original
+            for j, predicted_id, confidence in zip(
+                batch_indices, predicted, confidences
+            ):
                 category_key = LABEL_NAMES[predicted_id]
-                
-                results.append({
+                results[j] = {
                     "categoria": category_key,
                     "categoria_display": CATEGORIES[category_key]["display_name"],
                     "confianza": confidence
-                })
-        
+                }
+
         return results
 
 
@@ -188,22 +352,34 @@ def get_classifier() -> TextClassifier:
     global _classifier_instance
     if _classifier_instance is None:
         _classifier_instance = TextClassifier()
+        # El primer get_classifier paga la carga y el warmup; todas las
+        # peticiones posteriores encuentran el modelo caliente
+        _classifier_instance.warmup()
     return _classifier_instance
 
 
+@lru_cache(maxsize=1024)
+def _cached_predict(text: str, return_all_scores: bool) -> Dict:
+    """Predicción memoizada por (texto, return_all_scores)."""
+    return get_classifier().predict(text, return_all_scores=return_all_scores)
+
+
 def classify_text(text: str, return_all_scores: bool = False) -> Dict:
     """
     Función de conveniencia para clasificar un texto.
-    
+
+    Textos repetidos (típico en los reruns de Streamlit) se resuelven
+    desde un LRU en microsegundos en lugar de repetir el forward.
+
     Args:
         text: Texto a clasificar.
         return_all_scores: Si True, incluye todas las probabilidades.
-    
+
     Returns:
         Diccionario con la predicción.
     """
-    classifier = get_classifier()
-    return classifier.predict(text, return_all_scores=return_all_scores)
+    # Copia profunda: que el caller no pueda mutar la entrada cacheada
+    return copy.deepcopy(_cached_predict(text, return_all_scores))
 
 
 if __name__ == "__main__":
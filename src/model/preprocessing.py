@@ -3,13 +3,22 @@ Preprocesamiento y balanceo de datos para entrenamiento.
 Lee datos de MongoDB y genera conjuntos balanceados.
 """
 
+import hashlib
+import os
 import re
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from collections import Counter
-import random
-from sklearn.model_selection import train_test_split
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from joblib import Memory
 from src.data.db import get_collection, clear_collection
 
+# Cache en disco para evitar re-ejecutar el preprocesamiento completo cuando
+# los datos crudos no cambiaron entre corridas
+_memory = Memory(location=".cache/preproc", verbose=0)
+
 # Mapeo de categorías a IDs numéricos
 LABEL_MAP = {
     "arete": 0,
@@ -19,6 +28,17 @@ LABEL_MAP = {
 
 LABEL_NAMES = {v: k for k, v in LABEL_MAP.items()}
 
+# Tabla de traducción que elimina caracteres de control en un solo paso a
+# nivel C (equivale a re.sub(r'[\x00-\x1f\x7f-\x9f]', '', ...) pero sin
+# construir cadenas intermedias por cada coincidencia)
+_CONTROL_CHARS_TABLE = {
+    c: None for c in list(range(0x00, 0x20)) + list(range(0x7F, 0xA0))
+}
+
+# Compilada una sola vez: clean_text corre una vez por documento y re.sub
+# paga un lookup en el cache de re en cada llamada
+_WS_RE = re.compile(r'\s+')
+
 
 def clean_text(text: str) -> str:
     """
@@ -34,17 +54,29 @@ def clean_text(text: str) -> str:
         return ""
     
     # Eliminar espacios múltiples
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Eliminar caracteres de control
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-    
+    text = _WS_RE.sub(' ', text)
+
+    # Eliminar caracteres de control (un solo paso sobre la cadena)
+    text = text.translate(_CONTROL_CHARS_TABLE)
+
     # Trim
     text = text.strip()
     
     return text
 
 
+def split_bucket(text: str) -> int:
+    """
+    Bucket determinista 0-99 derivado del hash del texto.
+
+    El mismo texto cae siempre en el mismo bucket, por lo que el split
+    train/val/test es estable entre corridas e incluso si se agregan
+    documentos nuevos al corpus.
+    """
+    digest = hashlib.md5(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") % 100
+
+
 def get_category_distribution() -> Dict[str, int]:
     """Obtiene la distribución de categorías en raw_texts."""
     collection = get_collection("raw_texts")
@@ -55,76 +87,97 @@ def get_category_distribution() -> Dict[str, int]:
     return {item["_id"]: item["count"] for item in result}
 
 
-def balance_by_undersampling(documents: List[Dict]) -> List[Dict]:
+def _indices_by_class(documents: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Agrupa los índices de los documentos por categoría.
+
+    Un solo argsort estable + cortes por searchsorted: O(N log N) en C,
+    sin un escaneo np.where por clase ni dicts de listas en Python.
+    """
+    categorias = np.array([doc["categoria"] for doc in documents])
+    order = np.argsort(categorias, kind="stable")
+    classes, starts = np.unique(categorias[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    return {
+        cls: order[bounds[i]:bounds[i + 1]]
+        for i, cls in enumerate(classes)
+    }
+
+
+def balance_by_undersampling(
+    documents: List[Dict],
+    random_state: Optional[int] = None
+) -> List[Dict]:
     """
     Balancea las clases mediante subsampling de la clase mayoritaria.
-    
+
     Args:
         documents: Lista de documentos con campo 'categoria'
-    
+        random_state: Semilla para reproducibilidad
+
     Returns:
         Lista balanceada de documentos
     """
-    # Agrupar por categoría
-    by_category = {}
-    for doc in documents:
-        cat = doc["categoria"]
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(doc)
-    
-    # Encontrar el mínimo
-    min_count = min(len(docs) for docs in by_category.values())
-    
-    # Subsamplear cada categoría
-    balanced = []
-    for cat, docs in by_category.items():
-        sampled = random.sample(docs, min_count)
-        balanced.extend(sampled)
-    
+    # Índices por categoría a nivel NumPy: evita construir listas de
+    # documentos por clase y el muestreo corre vectorizado en C
+    by_class = _indices_by_class(documents)
+    min_count = min(len(indices) for indices in by_class.values())
+
+    rng = np.random.default_rng(random_state)
+    picks = np.concatenate([
+        rng.choice(indices, size=min_count, replace=False)
+        for indices in by_class.values()
+    ])
+
     # Mezclar
-    random.shuffle(balanced)
-    
-    return balanced
+    rng.shuffle(picks)
+
+    return [documents[i] for i in picks]
 
 
-def balance_by_oversampling(documents: List[Dict]) -> List[Dict]:
+def balance_by_oversampling(
+    documents: List[Dict],
+    random_state: Optional[int] = None
+) -> List[Dict]:
     """
     Balancea las clases mediante oversampling de las clases minoritarias.
-    
+
     Args:
         documents: Lista de documentos con campo 'categoria'
-    
+        random_state: Semilla para reproducibilidad
+
     Returns:
         Lista balanceada de documentos
     """
-    # Agrupar por categoría
-    by_category = {}
-    for doc in documents:
-        cat = doc["categoria"]
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(doc)
-    
-    # Encontrar el máximo
-    max_count = max(len(docs) for docs in by_category.values())
-    
-    # Oversamplear cada categoría
-    balanced = []
-    for cat, docs in by_category.items():
-        if len(docs) < max_count:
-            # Duplicar documentos hasta alcanzar max_count
-            oversampled = docs.copy()
-            while len(oversampled) < max_count:
-                oversampled.extend(random.sample(docs, min(len(docs), max_count - len(oversampled))))
-            balanced.extend(oversampled[:max_count])
-        else:
-            balanced.extend(docs)
-    
+    # Como en el undersampling: índices por clase a nivel NumPy y un único
+    # sorteo vectorizado con reemplazo en lugar del while con random.sample
+    by_class = _indices_by_class(documents)
+    max_count = max(len(indices) for indices in by_class.values())
+
+    rng = np.random.default_rng(random_state)
+    picks = []
+    for indices in by_class.values():
+        if len(indices) < max_count:
+            # Todos los originales más duplicados sorteados hasta max_count
+            extra = rng.choice(indices, size=max_count - len(indices), replace=True)
+            indices = np.concatenate([indices, extra])
+        picks.append(indices)
+
+    picks = np.concatenate(picks)
+
     # Mezclar
-    random.shuffle(balanced)
-    
-    return balanced
+    rng.shuffle(picks)
+
+    return [documents[i] for i in picks]
+
+
+def _insert_chunked(collection, docs: List[Dict], chunk_size: int = 5000) -> None:
+    """
+    Inserta documentos en lotes con ordered=False: escrituras paralelas del
+    lado del servidor y tamaño de comando acotado.
+    """
+    for i in range(0, len(docs), chunk_size):
+        collection.insert_many(docs[i:i + chunk_size], ordered=False)
 
 
 def preprocess_and_balance(
@@ -145,16 +198,18 @@ def preprocess_and_balance(
     Returns:
         Estadísticas del proceso
     """
-    random.seed(random_state)
-    
     print("=" * 60)
     print("🔄 Iniciando Preprocesamiento y Balanceo")
     print("=" * 60)
     
-    # Obtener datos crudos
+    # Obtener datos crudos: solo los dos campos que usa el preprocesamiento
+    # (el resto del documento BSON ni se decodifica) y cursor por lotes
     raw_collection = get_collection("raw_texts")
-    documents = list(raw_collection.find({}))
-    
+    cursor = raw_collection.find(
+        {}, {"_id": 0, "categoria": 1, "texto": 1}
+    ).batch_size(2000)
+    documents = [doc for doc in cursor if doc.get("texto")]
+
     print(f"\n📥 Documentos cargados: {len(documents)}")
     
     # Distribución inicial
@@ -163,10 +218,21 @@ def preprocess_and_balance(
     for cat, count in initial_dist.items():
         print(f"   • {cat}: {count}")
     
-    # Limpiar textos
+    # Limpiar textos: CPU-bound y trivialmente paralelo. Con corpus chicos
+    # el costo de arrancar los workers supera la ganancia, así que el pool
+    # solo se usa a partir de unos miles de documentos
     print("\n🧹 Limpiando textos...")
-    for doc in documents:
-        doc["texto_limpio"] = clean_text(doc["texto"])
+    raw_texts = [doc.get("texto", "") for doc in documents]
+    num_cpus = os.cpu_count() or 1
+    if len(raw_texts) >= 5000 and num_cpus > 1:
+        with Pool(num_cpus) as pool:
+            chunksize = max(1, len(raw_texts) // (num_cpus * 4))
+            cleaned = pool.map(clean_text, raw_texts, chunksize=chunksize)
+    else:
+        cleaned = [clean_text(t) for t in raw_texts]
+
+    for doc, texto_limpio in zip(documents, cleaned):
+        doc["texto_limpio"] = texto_limpio
     
     # Filtrar documentos sin texto válido
     documents = [d for d in documents if len(d["texto_limpio"]) > 10]
@@ -175,13 +241,13 @@ def preprocess_and_balance(
     # Balancear
     print(f"\n⚖️ Aplicando estrategia de balanceo: {balance_strategy}")
     if balance_strategy == "undersample":
-        balanced_docs = balance_by_undersampling(documents)
+        balanced_docs = balance_by_undersampling(documents, random_state=random_state)
         justification = (
             "Se eligió undersampling para evitar overfitting en clases minoritarias "
             "y mantener la diversidad natural de los datos."
         )
     else:
-        balanced_docs = balance_by_oversampling(documents)
+        balanced_docs = balance_by_oversampling(documents, random_state=random_state)
         justification = (
             "Se eligió oversampling para maximizar la cantidad de datos de entrenamiento "
             "sin perder información de ninguna clase."
@@ -197,25 +263,29 @@ def preprocess_and_balance(
     texts = [doc["texto_limpio"] for doc in balanced_docs]
     labels = [LABEL_MAP[doc["categoria"]] for doc in balanced_docs]
     
-    # Split estratificado
+    # Split determinista por hash del texto: una sola pasada, sin shuffle
+    # ni copias, y estable aunque el corpus crezca entre corridas
     print(f"\n✂️ Dividiendo datos (train={1-test_size-val_size:.0%}, val={val_size:.0%}, test={test_size:.0%})...")
-    
-    # Primero separar test
-    X_temp, X_test, y_temp, y_test = train_test_split(
-        texts, labels, 
-        test_size=test_size, 
-        stratify=labels, 
-        random_state=random_state
-    )
-    
-    # Luego separar validation del resto
-    val_ratio = val_size / (1 - test_size)
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_temp, y_temp,
-        test_size=val_ratio,
-        stratify=y_temp,
-        random_state=random_state
+
+    buckets = np.fromiter(
+        (split_bucket(t) for t in texts), dtype=np.int64, count=len(texts)
     )
+    test_cut = int(round(test_size * 100))
+    val_cut = test_cut + int(round(val_size * 100))
+
+    texts_arr = np.asarray(texts, dtype=object)
+    labels_arr = np.asarray(labels)
+
+    test_mask = buckets < test_cut
+    val_mask = (buckets >= test_cut) & (buckets < val_cut)
+    train_mask = buckets >= val_cut
+
+    X_train = texts_arr[train_mask].tolist()
+    y_train = labels_arr[train_mask].tolist()
+    X_val = texts_arr[val_mask].tolist()
+    y_val = labels_arr[val_mask].tolist()
+    X_test = texts_arr[test_mask].tolist()
+    y_test = labels_arr[test_mask].tolist()
     
     print(f"   • Train: {len(X_train)} samples")
     print(f"   • Val: {len(X_val)} samples")
@@ -230,11 +300,12 @@ def preprocess_and_balance(
     
     # Guardar datos procesados completos
     processed_collection = get_collection("processed_texts")
+    # El bucket persistido hace idempotente cualquier re-split posterior
     processed_docs = [
-        {"texto": t, "label": l, "categoria": LABEL_NAMES[l]}
-        for t, l in zip(texts, labels)
+        {"texto": t, "label": l, "categoria": LABEL_NAMES[l], "bucket": int(b)}
+        for t, l, b in zip(texts, labels, buckets)
     ]
-    processed_collection.insert_many(processed_docs)
+    _insert_chunked(processed_collection, processed_docs)
     
     # Guardar splits
     def save_split(collection_name: str, X: List[str], y: List[int]):
@@ -244,12 +315,29 @@ def preprocess_and_balance(
             for t, l in zip(X, y)
         ]
         if docs:
-            collection.insert_many(docs)
+            _insert_chunked(collection, docs)
     
     save_split("train_data", X_train, y_train)
     save_split("val_data", X_val, y_val)
     save_split("test_data", X_test, y_test)
-    
+
+    # Copia columnar en Parquet (zstd + dictionary encoding): una escritura
+    # secuencial por split, y el entrenamiento puede leerla memory-mapped
+    # sin round-trips a Mongo. Mongo sigue siendo la fuente de verdad
+    data_dir = Path("data")
+    data_dir.mkdir(exist_ok=True)
+    for split_name, X, y in (
+        ("train", X_train, y_train),
+        ("val", X_val, y_val),
+        ("test", X_test, y_test),
+    ):
+        pd.DataFrame({"texto": X, "label": y}).to_parquet(
+            data_dir / f"{split_name}.parquet",
+            compression="zstd",
+            index=False
+        )
+    print(f"   ✓ Splits también en Parquet: {data_dir}/")
+
     print("   ✓ Datos guardados exitosamente")
     
     # Estadísticas finales
@@ -272,5 +360,55 @@ def preprocess_and_balance(
     return stats
 
 
+def _raw_texts_signature() -> Tuple:
+    """
+    Firma barata del contenido de raw_texts (conteo + último _id).
+    Cambia si el ETL volvió a cargar datos; suficiente como clave de cache.
+    """
+    collection = get_collection("raw_texts")
+    count = collection.estimated_document_count()
+    last = collection.find_one(sort=[("_id", -1)], projection=["_id"])
+    return (count, str(last["_id"]) if last else None)
+
+
+@_memory.cache
+def _preprocess_cached(
+    signature: Tuple,
+    code_hash: str,
+    balance_strategy: str,
+    test_size: float,
+    val_size: float,
+    random_state: int
+) -> Dict:
+    # signature y code_hash solo participan en la clave de cache
+    return preprocess_and_balance(
+        balance_strategy=balance_strategy,
+        test_size=test_size,
+        val_size=val_size,
+        random_state=random_state
+    )
+
+
+def preprocess_and_balance_cached(
+    balance_strategy: str = "undersample",
+    test_size: float = 0.15,
+    val_size: float = 0.15,
+    random_state: int = 42
+) -> Dict:
+    """
+    Versión cacheada de preprocess_and_balance.
+
+    Si raw_texts no cambió desde la última corrida (y el código de
+    preprocesamiento tampoco), devuelve las estadísticas guardadas sin
+    repetir limpieza, balanceo ni escritura de splits.
+    """
+    signature = _raw_texts_signature()
+    # Incluir el bytecode en la clave invalida el cache si cambia la lógica
+    code_hash = hashlib.sha1(preprocess_and_balance.__code__.co_code).hexdigest()
+    return _preprocess_cached(
+        signature, code_hash, balance_strategy, test_size, val_size, random_state
+    )
+
+
 if __name__ == "__main__":
     stats = preprocess_and_balance(balance_strategy="undersample")